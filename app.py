@@ -1,17 +1,24 @@
 # ✅ AI E-Commerce Recommender UI
+# recommend is imported first: it sets the BLAS thread counts, which must
+# happen before anything else loads numpy (see the top of recommend.py).
+import recommend
+import os
 import streamlit as st
 import pandas as pd
-import seaborn as sns
-import matplotlib.pyplot as plt
+import matplotlib
+matplotlib.use("Agg")  # headless backend; figures are only rendered to PNG
+from matplotlib.figure import Figure
 import numpy as np
-import os
+import io
+import threading
 from recommend import (
-    rating_matrix,
     products,
-    item_similarity,
-    user_similarity,
     hybrid_recommend,
     get_hybrid_scores,
+    rated_mask,
+    top_k,
+    top_popular_products,
+    top10_neighbors,
 )
 
 # -------------------- Page Settings --------------------
@@ -21,6 +28,79 @@ st.set_page_config(page_title="AI E-Commerce Recommender",
 # Ensure output folder exists
 os.makedirs("output", exist_ok=True)
 
+# -------------------- Cached Model --------------------
+@st.cache_resource(show_spinner=False)
+def load_matrices():
+    """Share the rating & similarity matrices across reruns and sessions."""
+    return (
+        recommend.rating_matrix,
+        recommend.item_similarity_q8,
+        recommend.user_similarity,
+        recommend.user_similarity_q8,
+    )
+
+rating_matrix, item_similarity_q8, user_similarity, user_similarity_q8 = load_matrices()
+
+# -------------------- Cached Figures --------------------
+# Figures are rendered to PNG bytes and cached on their inputs, so slider,
+# theme and radio reruns don't rebuild axes, colorbars and tick labels.
+# Each cache keeps at most 64 PNGs, since score charts vary per (user, alpha).
+# A reused Figure per chart, created outside pyplot's global figure
+# manager; the lock serializes sessions drawing into the same figure.
+@st.cache_resource(show_spinner=False)
+def get_fig(key):
+    return Figure(), threading.Lock()
+
+def reset_fig(fig, size):
+    fig.clear()
+    fig.set_size_inches(*size)
+    return fig.add_subplot(111)
+
+def fig_to_png(fig):
+    buf = io.BytesIO()
+    fig.savefig(buf, format="png", bbox_inches="tight", dpi=200)  # as st.pyplot renders
+    return buf.getvalue()
+
+def draw_heatmap(fig, ax, M, cmap):
+    """Similarity heatmap as a single AxesImage with labelled ticks."""
+    im = ax.imshow(M.values, cmap=cmap, aspect="auto")
+    fig.colorbar(im, ax=ax)
+    ax.set_xticks(range(len(M.columns)))
+    ax.set_xticklabels(M.columns, rotation=90)
+    ax.set_yticks(range(len(M.index)))
+    ax.set_yticklabels(M.index)
+
+def save_png(png, path):
+    with open(path, "wb") as f:
+        f.write(png)
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def render_scores_chart(scores):
+    fig, lock = get_fig("scores")
+    with lock:
+        ax = reset_fig(fig, (8,4))
+        scores.plot(kind="bar", ax=ax)
+        ax.set_title("Top Predicted Recommendation Scores")
+        return fig_to_png(fig)
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def render_item_heatmap(top_items):
+    fig, lock = get_fig("item_heatmap")
+    with lock:
+        ax = reset_fig(fig, (8,6))
+        draw_heatmap(fig, ax, item_similarity_q8.loc[top_items, top_items] / 127, "coolwarm")
+        ax.set_title("Item Correlation Heatmap")
+        return fig_to_png(fig)
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def render_user_heatmap(sim_users):
+    fig, lock = get_fig("user_heatmap")
+    with lock:
+        ax = reset_fig(fig, (7,5))
+        draw_heatmap(fig, ax, user_similarity_q8.loc[sim_users, sim_users] / 127, "Blues")
+        ax.set_title("User Similarity Heatmap")
+        return fig_to_png(fig)
+
 # -------------------- Theme Toggle --------------------
 theme = st.sidebar.radio("Theme", ["Light", "Dark"], key="theme_toggle")
 if theme == "Dark":
@@ -61,31 +141,37 @@ if st.button("✨ Recommend"):
     st.session_state.recs = hybrid_recommend(user, alpha, top_n, price_limit, cat)
     st.session_state.scores = get_hybrid_scores(user, alpha)
 
+    # Resolve image paths once per recommendation set, not on every rerun
+    img_paths = [
+        p if p.lower().startswith("images/") else os.path.join("images", p)
+        for p in st.session_state.recs["image"].astype(str).str.strip()
+    ]
+    st.session_state.img_paths = img_paths
+    st.session_state.img_exists = [os.path.exists(p) for p in img_paths]
+
 if st.session_state.recs is None or st.session_state.recs.empty:
     st.info("👉 Select a user & click Recommend to see results.")
     st.stop()
 
 # -------------------- Show Recommendations --------------------
 st.subheader(f"✅ Recommended Products for {user}")
-for _, row in st.session_state.recs.iterrows():
+recs = st.session_state.recs.to_dict(orient="list")
+for i in range(len(recs["product"])):
     col1, col2 = st.columns([1, 4])
 
-    img = str(row["image"]).strip()
-    if not img.lower().startswith("images/"):
-        img = os.path.join("images", img)
-
     with col1:
-        if os.path.exists(img):
-            st.image(img, width=110)
+        if st.session_state.img_exists[i]:
+            st.image(st.session_state.img_paths[i], width=110)
         else:
             st.markdown("📦")
 
     with col2:
-        st.markdown(f"### {row['product_name']}")
-        stars = "⭐" * min(5, max(1, int(row['score'])))
-        st.write(f"Predicted Score: {row['score']:.2f} {stars}")
-        st.write(f"Price: ₹{row['price']}")
-        st.write(f"Category: {row['category']}")
+        score = recs["score"][i]
+        st.markdown(f"### {recs['product_name'][i]}")
+        stars = "⭐" * min(5, max(1, int(score)))
+        st.write(f"Predicted Score: {score:.2f} {stars}")
+        st.write(f"Price: ₹{recs['price'][i]}")
+        st.write(f"Category: {recs['category'][i]}")
 
     st.markdown("---")
 
@@ -97,37 +183,26 @@ opt = st.radio(
     key="vis_radio"
 )
 
-already = rating_matrix.loc[user] > 0
-scores = st.session_state.scores[~already].sort_values(ascending=False).head(20)
+already = rated_mask(user)
+scores = top_k(st.session_state.scores[~already], 20)
 
 # -------------------- Graphs --------------------
 if opt == "Hybrid Score Chart":
-    fig, ax = plt.subplots(figsize=(8,4))
-    scores.plot(kind="bar", ax=ax)
-    ax.set_title("Top Predicted Recommendation Scores")
-    st.pyplot(fig)
-    if save: fig.savefig(f"output/scores_{user}.png")
-
-    
+    png = render_scores_chart(scores)
+    st.image(png)
+    if save: save_png(png, f"output/scores_{user}.png")
 
 elif opt == "Item Similarity Heatmap":
-    top_items = (rating_matrix > 0).sum().sort_values(ascending=False).head(20).index
-    fig, ax = plt.subplots(figsize=(8,6))
-    sns.heatmap(item_similarity.loc[top_items, top_items], cmap="coolwarm", ax=ax, linecolor='black',   # color of the cell borders
-    linewidths=0.5)
-    ax.set_title("Item Correlation Heatmap")
-    st.pyplot(fig)
-    if save: fig.savefig(f"output/item_sim_{user}.png")
+    png = render_item_heatmap(top_popular_products)
+    st.image(png)
+    if save: save_png(png, f"output/item_sim_{user}.png")
 
 elif opt == "User Similarity Heatmap":
     sim_users = user_similarity[user].sort_values(ascending=False).head(8).index
-    fig, ax = plt.subplots(figsize=(7,5))
-    sns.heatmap(user_similarity.loc[sim_users, sim_users], cmap="Blues", ax=ax ,linecolor='black',   # color of the cell borders
-    linewidths=0.5)
-    ax.set_title("User Similarity Heatmap")
-    st.pyplot(fig)
-    if save: fig.savefig(f"output/user_sim_{user}.png")
+    png = render_user_heatmap(list(sim_users))
+    st.image(png)
+    if save: save_png(png, f"output/user_sim_{user}.png")
 
 elif opt == "Similar Users Table":
-    sim = user_similarity[user].sort_values(ascending=False).drop(user)
-    st.table(pd.DataFrame({"User": sim.index, "Similarity Score": sim.values}).head(10))
+    sim_ids, sim_scores = top10_neighbors[user]
+    st.table(pd.DataFrame({"User": sim_ids, "Similarity Score": sim_scores}))
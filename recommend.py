@@ -2,23 +2,44 @@
 Hybrid recommender module for AI E-Commerce.
 Exports:
  - rating_matrix : pandas DataFrame (users x products)
+ - rating_csr : scipy CSR matrix of the same ratings
  - products : product metadata DataFrame
+ - products_by_id : product id -> tuple of metadata in product_fields order
  - item_similarity : item-item cosine similarity DataFrame
  - user_similarity : user-user cosine similarity DataFrame
+ - item_similarity_q8 / user_similarity_q8 : int8 (x127) copies for heatmaps
  - hybrid_recommend(...) -> pandas DataFrame of recommendations
  - get_hybrid_scores(...) -> pandas Series of hybrid scores
+ - rated_mask(...) -> boolean array of products a user has rated
+ - top_k(...) -> k highest entries of a Series, sorted descending
+ - product_popularity : number of raters per product
+ - top_popular_products : ids of the 20 most-rated products
+ - top10_neighbors : user -> (ids, scores) of their 10 most similar users
 """
 
+import os
+
+# Let BLAS use every core available to this process for the dense GEMMs;
+# must be set before numpy loads. Affinity respects cgroup cpusets where
+# supported, and setdefault keeps any limit the deployment configured.
+if hasattr(os, "sched_getaffinity"):
+    _ncpu = len(os.sched_getaffinity(0))
+else:
+    _ncpu = os.cpu_count()
+for _var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+    os.environ.setdefault(_var, str(_ncpu))
+
 import pandas as pd
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
-import os
+from scipy import sparse
+from sklearn.preprocessing import normalize
+import hashlib
 
 # -------------------- Load Data --------------------
 RATINGS_CSV = "data/ecommerce_ratings.csv"
 PRODUCTS_CSV = "data/ecommerce_products.csv"
 
-ratings = pd.read_csv(RATINGS_CSV)
+ratings = pd.read_csv(RATINGS_CSV, dtype={"rating": "float32"})
 products = pd.read_csv(PRODUCTS_CSV)
 
 # Ensure optional columns exist
@@ -29,59 +50,212 @@ if "category" not in products.columns:
 if "image" not in products.columns:
     products["image"] = ""
 
-# -------------------- Build Rating Matrix (NaN-Safe) --------------------
-rating_matrix = ratings.pivot_table(
-    index="user",
-    columns="product",
-    values="rating"
+# product id -> tuple of its metadata, for per-recommendation lookups
+product_fields = [c for c in products.columns if c != "product"]
+products_by_id = dict(zip(
+    products["product"],
+    products[product_fields].itertuples(index=False, name=None),
+))
+
+# -------------------- Build Rating Matrix (Sparse) --------------------
+# Categorical ids so grouping and indexing work on integer codes. Products
+# use the catalog's own ids (and dtype) as categories; ratings for products
+# missing from the catalog are dropped, but their users are kept.
+ratings = ratings.dropna(subset=["rating"])
+ratings = ratings.assign(user=ratings["user"].astype("category"))
+ratings = ratings[ratings["product"].isin(products["product"])]
+ratings = ratings.assign(
+    product=ratings["product"].astype(pd.CategoricalDtype(products["product"])),
 )
 
-# Include all products from the dataset
-rating_matrix = rating_matrix.reindex(columns=products["product"], fill_value=0)
+# Average duplicate (user, product) ratings, as pivot_table did.
+ratings = ratings.groupby(["user", "product"], as_index=False, observed=True)["rating"].mean()
+
+users = ratings["user"].cat.categories
+user_codes = ratings["user"].cat.codes.values
+prod_codes = ratings["product"].cat.codes.values
 
-# Fill any remaining NaNs with 0
-rating_matrix = rating_matrix.fillna(0)
+rating_csr = sparse.coo_matrix(
+    (
+        ratings["rating"].values,
+        (user_codes, prod_codes),
+    ),
+    shape=(len(users), len(products)),
+    dtype=np.float32,
+).tocsr()
+
+# Densified once, already shaped over the full catalog; copy=False keeps
+# the frame a view of that array instead of a second allocation.
+rating_matrix = pd.DataFrame(
+    rating_csr.toarray(),
+    index=pd.Index(users, name="user"),
+    columns=pd.Index(products["product"], name="product"),
+    copy=False,
+)
 
 # -------------------- Compute Similarity Matrices --------------------
+# Cosine similarity as a Gram matrix of L2-normalized ratings: normalize
+# users (rows) and items (columns) once each, then one sparse GEMM per side.
+# The outputs stay dense since items sharing any rater have nonzero
+# similarity; float32 halves the bandwidth of every pass over them.
+def _item_similarity():
+    rn = normalize(rating_csr, axis=0)
+    return (rn.T @ rn).toarray()
+
+def _user_similarity():
+    rn = normalize(rating_csr, axis=1)
+    return (rn @ rn.T).toarray()
+
+# -------------------- Similarity Cache --------------------
+# Similarities are persisted as .npy files keyed on the CSV mtimes and
+# memory-mapped on load, so restarts skip the similarity GEMMs. Each
+# process still builds its own derived arrays (weights, int8 copies).
+CACHE_DIR = "cache"
+
+# Bump whenever the rating build or similarity computation changes, so
+# results cached by older code are not served.
+CACHE_VERSION = 1
+
+_data_sig = hashlib.md5(
+    (
+        str(CACHE_VERSION)
+        + str(os.path.getmtime(RATINGS_CSV))
+        + str(os.path.getmtime(PRODUCTS_CSV))
+    ).encode()
+).hexdigest()[:12]
+
+def _remove_stale_cache():
+    """Delete cached arrays written for any other signature."""
+    for entry in os.scandir(CACHE_DIR):
+        if entry.name.startswith("sim_") and not entry.name.startswith(f"sim_{_data_sig}_"):
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+def _cached_array(name, compute):
+    """Load cache/sim_<sig>_<name>.npy read-only, computing and saving it on a miss."""
+    path = os.path.join(CACHE_DIR, f"sim_{_data_sig}_{name}.npy")
+    try:
+        return np.load(path, mmap_mode="r")
+    except (OSError, ValueError):
+        pass
+    arr = compute()
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            np.save(f, arr)
+        os.replace(tmp, path)  # atomic, so other workers never see a partial file
+        _remove_stale_cache()
+    except OSError:
+        pass  # read-only deployment: just use the in-memory result
+    return arr
+
 item_similarity = pd.DataFrame(
-    cosine_similarity(rating_matrix.T),
+    _cached_array("item", _item_similarity),
     index=rating_matrix.columns,
-    columns=rating_matrix.columns
+    columns=rating_matrix.columns,
+    copy=False,
 )
 
 user_similarity = pd.DataFrame(
-    cosine_similarity(rating_matrix),
+    _cached_array("user", _user_similarity),
     index=rating_matrix.index,
-    columns=rating_matrix.index
+    columns=rating_matrix.index,
+    copy=False,
 )
 
+# int8 copies for the heatmap previews, which don't need full precision.
+# Ratings are non-negative, so similarities lie in [0, 1].
+item_similarity_q8 = (item_similarity * 127).round().astype(np.int8)
+user_similarity_q8 = (user_similarity * 127).round().astype(np.int8)
+
+# -------------------- Raw Arrays --------------------
+# Contiguous float32 views; pandas index alignment is pure overhead here.
+_R = np.ascontiguousarray(rating_matrix.values)
+_IS = item_similarity.values
+_US = user_similarity.values
+_user_index = {u: i for i, u in enumerate(rating_matrix.index)}
+_rated = _R > 0  # users x products mask of already-rated items
+
+# -------------------- Precomputed Scores --------------------
+# Row-normalized similarity weights. The user side zeroes the diagonal so
+# each user's own ratings are excluded from their neighbourhood average.
+_W_item = _IS / (_IS.sum(axis=1, keepdims=True) + 1e-9)
+_W_user = _US.copy()
+np.fill_diagonal(_W_user, 0.0)
+_W_user /= _W_user.sum(axis=1, keepdims=True) + 1e-9
+
+# Both score components for every user (users x products), built once so
+# serving a user is a row lookup instead of two GEMVs per call. The user
+# side is stored as its difference from the item side, so that
+# hybrid = item + alpha * (user - item) is a single scale-and-add.
+_H_item = _R @ _W_item.T
+_H_delta = _W_user @ _R
+_H_delta -= _H_item
+
 # -------------------- Score Functions --------------------
 def item_based_score(user_id):
     """Predict score for each item based on item similarity & user's ratings."""
-    user_ratings = rating_matrix.loc[user_id]
-    scores = item_similarity.dot(user_ratings) / (item_similarity.sum(axis=1) + 1e-9)
-    return scores
+    return pd.Series(_H_item[_user_index[user_id]], index=rating_matrix.columns)
 
 def user_based_score(user_id):
     """Predict score for each item based on similar users' ratings."""
-    sims = user_similarity[user_id].copy()
-    sims = sims.drop(user_id)  # exclude self
-    other_ratings = rating_matrix.loc[sims.index]
-    weighted = sims.values.dot(other_ratings) / (sims.values.sum() + 1e-9)
-    scores = pd.Series(weighted, index=rating_matrix.columns)
-    return scores
+    u = _user_index[user_id]
+    return pd.Series(_H_item[u] + _H_delta[u], index=rating_matrix.columns)
+
+def rated_mask(user_id):
+    """Boolean array over products marking items user_id has already rated."""
+    return _rated[_user_index[user_id]]
 
 def get_hybrid_scores(user_id, alpha=0.6):
     """
     Compute hybrid score = alpha * user_based + (1-alpha) * item_based
     Returns a pandas Series indexed by product id.
     """
-    if user_id not in rating_matrix.index:
+    if user_id not in _user_index:
         raise ValueError(f"User {user_id} not found in rating matrix.")
-    ib = item_based_score(user_id)
-    ub = user_based_score(user_id)
-    hybrid = alpha * ub + (1 - alpha) * ib
-    return hybrid
+    u = _user_index[user_id]
+    # Fused into one output buffer, with no intermediate arrays.
+    hybrid = np.multiply(_H_delta[u], alpha)
+    hybrid += _H_item[u]
+    return pd.Series(hybrid, index=rating_matrix.columns)
+
+def top_k(scores, k):
+    """
+    Return the k highest entries of a Series, sorted descending.
+    Uses argpartition: O(n + k log k) instead of a full sort.
+    """
+    vals = scores.values
+    k = min(k, len(vals))
+    if k <= 0:
+        return scores.iloc[:0]
+    idx = np.argpartition(-vals, k - 1)[:k]
+    idx = idx[np.argsort(-vals[idx])]
+    return scores.iloc[idx]
+
+# -------------------- Popularity --------------------
+# Number of users who rated each product, and the 20 most-rated products
+# (used by the item heatmap), computed once instead of per view.
+product_popularity = pd.Series(_rated.sum(axis=0), index=rating_matrix.columns)
+top_popular_products = top_k(product_popularity, 20).index.tolist()
+
+# -------------------- Similar Users --------------------
+def _top_neighbors(k):
+    """Map each user to (ids, scores) of their k most similar other users."""
+    sims = _US.copy()
+    np.fill_diagonal(sims, -np.inf)  # never list a user as their own neighbour
+    k = min(k, len(sims) - 1)
+    if k <= 0:
+        return {u: ([], np.empty(0, dtype=sims.dtype)) for u in rating_matrix.index}
+    idx = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(sims, idx, axis=1), axis=1)
+    idx = np.take_along_axis(idx, order, axis=1)
+    users = rating_matrix.index
+    return {u: (users[idx[i]].tolist(), sims[i, idx[i]]) for i, u in enumerate(users)}
+
+top10_neighbors = _top_neighbors(10)
 
 # -------------------- Hybrid Recommendation --------------------
 def hybrid_recommend(user_id, alpha=0.6, top_n=5, price_limit=None, category=None):
@@ -95,13 +269,15 @@ def hybrid_recommend(user_id, alpha=0.6, top_n=5, price_limit=None, category=Non
     hybrid = get_hybrid_scores(user_id, alpha=alpha)
 
     # exclude already rated items
-    already_rated = rating_matrix.loc[user_id] > 0
+    already_rated = rated_mask(user_id)
     candidates = hybrid[~already_rated]
 
-    # merge with product metadata
-    recs = candidates.sort_values(ascending=False).head(top_n).reset_index()
-    recs.columns = ["product", "score"]
-    recs = recs.merge(products, on="product", how="left")
+    # attach product metadata by direct lookup
+    top = top_k(candidates, top_n)
+    recs = pd.DataFrame(
+        [(pid, score, *products_by_id[pid]) for pid, score in top.items()],
+        columns=["product", "score", *product_fields],
+    )
 
     # apply filters
     if price_limit is not None and "price" in recs.columns:
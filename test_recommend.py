@@ -1,6 +1,196 @@
+"""
+Tests for the hybrid recommender. Run from the repo root:
+    python -m pytest -q
+Running the file directly prints sample recommendations.
+"""
+
+import importlib.util
+import os
+
+import numpy as np
+import pandas as pd
+
+import recommend
 from recommend import hybrid_recommend
 
-user_id = "U10"
-results = hybrid_recommend(user_id, top_n=5)
-print(f"\nTop 5 Product Recommendations for {user_id}:\n")
-print(results)
+ROOT = os.path.dirname(os.path.abspath(__file__))
+RATINGS_CSV = os.path.join(ROOT, "data", "ecommerce_ratings.csv")
+PRODUCTS_CSV = os.path.join(ROOT, "data", "ecommerce_products.csv")
+
+
+def load_recommend(tmp_path, monkeypatch, ratings, products):
+    """Import a fresh copy of recommend.py over the given ratings/products tables."""
+    (tmp_path / "data").mkdir()
+    ratings.to_csv(tmp_path / "data" / "ecommerce_ratings.csv", index=False)
+    products.to_csv(tmp_path / "data" / "ecommerce_products.csv", index=False)
+    monkeypatch.chdir(tmp_path)
+    spec = importlib.util.spec_from_file_location(
+        "recommend_under_test", os.path.join(ROOT, "recommend.py")
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+# -------------------- Rating Matrix --------------------
+def test_numeric_ids(tmp_path, monkeypatch):
+    ratings = pd.read_csv(RATINGS_CSV)
+    products = pd.read_csv(PRODUCTS_CSV)
+    ratings["user"] = ratings["user"].str[1:].astype(int)
+    ratings["product"] = ratings["product"].str[1:].astype(int)
+    products["product"] = products["product"].str[1:].astype(int)
+    known_sum = ratings["rating"].sum()
+
+    # a repeated rating (averaged away), a product missing from the catalog,
+    # and a user whose only rating is for that missing product
+    first = ratings[ratings["user"] == 10].iloc[[0]]
+    extra = pd.DataFrame({"user": [10, 99], "product": [999, 999], "rating": [5, 4]})
+    ratings = pd.concat([ratings, first, extra], ignore_index=True)
+
+    rec = load_recommend(tmp_path, monkeypatch, ratings, products)
+
+    assert rec.rating_matrix.index.dtype.kind == "i"
+    assert rec.rating_matrix.columns.dtype.kind == "i"
+    assert 999 not in rec.rating_matrix.columns
+    assert rec.rating_matrix.values.sum() == known_sum
+    assert rec.rating_matrix.loc[99].sum() == 0
+    np.testing.assert_allclose(
+        rec.get_hybrid_scores(10).values,
+        recommend.get_hybrid_scores("U10").values,
+        rtol=1e-5,
+    )
+
+
+# -------------------- Hybrid Recommendation --------------------
+def reference_recommend(user_id, alpha=0.6, top_n=5):
+    """The original pivot_table / cosine_similarity / merge implementation."""
+    from sklearn.metrics.pairwise import cosine_similarity
+
+    ratings = pd.read_csv(RATINGS_CSV)
+    products = pd.read_csv(PRODUCTS_CSV)
+    R = ratings.pivot_table(index="user", columns="product", values="rating")
+    R = R.reindex(columns=products["product"], fill_value=0).fillna(0)
+    item_sim = pd.DataFrame(cosine_similarity(R.T), index=R.columns, columns=R.columns)
+    user_sim = pd.DataFrame(cosine_similarity(R), index=R.index, columns=R.index)
+
+    ib = item_sim.dot(R.loc[user_id]) / (item_sim.sum(axis=1) + 1e-9)
+    sims = user_sim[user_id].drop(user_id)
+    ub = pd.Series(
+        sims.values.dot(R.loc[sims.index]) / (sims.values.sum() + 1e-9), index=R.columns
+    )
+    hybrid = alpha * ub + (1 - alpha) * ib
+
+    recs = hybrid[~(R.loc[user_id] > 0)].sort_values(ascending=False).head(top_n).reset_index()
+    recs.columns = ["product", "score"]
+    return recs.merge(products, on="product", how="left")
+
+
+def test_hybrid_recommend_matches_reference():
+    for alpha in (0.0, 0.6, 1.0):
+        got = hybrid_recommend("U10", alpha=alpha, top_n=10)
+        expected = reference_recommend("U10", alpha=alpha, top_n=10)
+        assert list(got.columns) == list(expected.columns)
+        pd.testing.assert_frame_equal(
+            got.drop(columns="score"), expected.drop(columns="score")
+        )
+        np.testing.assert_allclose(got["score"], expected["score"], rtol=1e-5)
+
+
+# -------------------- Top-K Selection --------------------
+def test_top_k_matches_full_sort():
+    scores = recommend.get_hybrid_scores("U10")
+    for k in (0, 1, 5, len(scores), len(scores) + 5):
+        got = recommend.top_k(scores, k)
+        expected = scores.sort_values(ascending=False).head(k)
+        assert set(got.index) == set(expected.index)
+        assert got.is_monotonic_decreasing
+
+
+def test_top_k_ties():
+    scores = pd.Series([1.0, 3.0, 3.0, 2.0, 3.0], index=list("abcde"))
+    top2 = recommend.top_k(scores, 2)
+    assert top2.tolist() == [3.0, 3.0]
+    assert set(top2.index) <= {"b", "c", "e"}
+    assert set(recommend.top_k(scores, 4).index) == {"b", "c", "d", "e"}
+    assert recommend.top_k(scores, 0).empty
+
+
+# -------------------- Similar Users --------------------
+def test_top10_neighbors_excludes_self():
+    for user, (ids, scores) in recommend.top10_neighbors.items():
+        assert user not in ids
+        assert len(ids) == len(scores) == 10
+        expected = recommend.user_similarity[user].drop(user).sort_values(ascending=False)
+        np.testing.assert_allclose(scores, expected.values[:10])
+
+
+def test_top10_neighbors_few_users(tmp_path, monkeypatch):
+    ratings = pd.DataFrame({
+        "user": ["A", "A", "B", "C", "C"],
+        "product": ["P1", "P2", "P1", "P2", "P3"],
+        "rating": [5, 3, 4, 2, 1],
+    })
+    products = pd.DataFrame({"product": ["P1", "P2", "P3"]})
+
+    rec = load_recommend(tmp_path, monkeypatch, ratings, products)
+
+    assert set(rec.top10_neighbors) == {"A", "B", "C"}
+    for user, (ids, scores) in rec.top10_neighbors.items():
+        assert sorted(ids) == sorted({"A", "B", "C"} - {user})
+        assert len(scores) == 2
+        assert scores[0] >= scores[1]
+
+
+def test_top10_neighbors_single_user(tmp_path, monkeypatch):
+    ratings = pd.DataFrame({"user": ["A"], "product": ["P1"], "rating": [5]})
+    products = pd.DataFrame({"product": ["P1", "P2"]})
+
+    rec = load_recommend(tmp_path, monkeypatch, ratings, products)
+
+    ids, scores = rec.top10_neighbors["A"]
+    assert ids == [] and len(scores) == 0
+
+
+# -------------------- Similarity Cache --------------------
+def test_cache_hit_matches_miss(tmp_path, monkeypatch):
+    rec = load_recommend(
+        tmp_path, monkeypatch, pd.read_csv(RATINGS_CSV), pd.read_csv(PRODUCTS_CSV)
+    )
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return np.arange(12, dtype=np.float32).reshape(3, 4)
+
+    miss = rec._cached_array("probe", compute)
+    hit = rec._cached_array("probe", compute)
+    assert len(calls) == 1
+    assert isinstance(hit, np.memmap)
+    np.testing.assert_array_equal(hit, miss)
+
+    # the similarities computed at import were cached the same way
+    hit_item = np.load(tmp_path / rec.CACHE_DIR / f"sim_{rec._data_sig}_item.npy")
+    np.testing.assert_array_equal(hit_item, rec.item_similarity.values)
+
+
+def test_cache_removes_stale_signatures(tmp_path, monkeypatch):
+    stale = tmp_path / "cache" / "sim_000000000000_item.npy"
+    stale.parent.mkdir()
+    np.save(stale, np.zeros(1))
+
+    rec = load_recommend(
+        tmp_path, monkeypatch, pd.read_csv(RATINGS_CSV), pd.read_csv(PRODUCTS_CSV)
+    )
+
+    assert not stale.exists()
+    assert sorted(p.name for p in stale.parent.iterdir()) == [
+        f"sim_{rec._data_sig}_item.npy",
+        f"sim_{rec._data_sig}_user.npy",
+    ]
+
+
+if __name__ == "__main__":
+    user_id = "U10"
+    results = hybrid_recommend(user_id, top_n=5)
+    print(f"\nTop 5 Product Recommendations for {user_id}:\n")
+    print(results)